@@ -13,30 +13,59 @@
 # limitations under the License.
 
 import argparse
-import configparser
+import ast
+import functools
 import json
+import os
 import re
 import sys
+import threading
 import tomllib
+import warnings
 from collections import defaultdict
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
 from pathlib import Path
 from typing import Any
+from typing import ClassVar
 from typing import Literal
 
 
-# https://chriswheeler.dev/posts/how-to-use-colors-in-terminals/
-color_reset: str = "\x1b[0m"
-yellow: str = "\x1b[33m"
-red: str = "\x1b[31m"
+try:
+    # ijson is optional; if it's installed, it's used to stream large package-lock.json files
+    import ijson
+except ImportError:
+    ijson = None
+
 
 # https://packaging.python.org/en/latest/specifications/dependency-specifiers/#grammar
+py_dep_name_regex: str = r"[a-zA-Z0-9](?:[a-zA-Z0-9._-]*[a-zA-Z0-9])?"
 py_dep_spec_pattern: re.Pattern = re.compile(
-    r"^\s*(?P<name>[a-zA-Z0-9](?:[a-zA-Z0-9._-]*[a-zA-Z0-9])?)\b\s*(?P<extras>\[[^\[\]]*\])?\s*(?:@.+|(?P<versionspec>[\(<>=!~][^;]*)?).*"
+    rf"^\s*(?P<name>{py_dep_name_regex})\b\s*(?P<extras>\[[^\[\]]*\])?\s*(?:@.+|(?P<versionspec>[\(<>=!~][^;]*)?).*"
+)
+# Each pip requirements file line is either a reference to another requirements file or starts with
+# a dependency specifier. The name group is built from py_dep_name_regex like py_dep_spec_pattern's
+# is, and the rest of py_dep_spec_pattern is optional so it doesn't need to be matched here.
+pip_req_line_pattern: re.Pattern = re.compile(
+    rf"^\s*(?:-r\s+(?P<ref>\S+\.txt)$|(?P<name>{py_dep_name_regex})\b)"
 )
-pip_file_ref_pattern: re.Pattern = re.compile(r"^-r (\S+\.txt)$")
 py_inline_pattern: re.Pattern = re.compile(
     r"(?m)^# /// (?P<type>[a-zA-Z0-9-]+)$\s(?P<content>(^#(| .*)$\s)+)^# ///$"
 )
+# These are for setup.py files that can't be parsed as Python 3, such as Python 2 files. The list
+# pattern allows one level of nested brackets for extras.
+setup_py_dep_list_pattern: re.Pattern = re.compile(
+    r"install_requires\s*=\s*\[(?P<items>(?:[^\[\]]|\[[^\[\]]*\])*)\]"
+)
+setup_py_dep_list_item_pattern: re.Pattern = re.compile(
+    r"""\s*(?:#[^\n]*|,|(?P<quote>['"])(?P<spec>(?:\\.|(?!(?P=quote))[^\\\n])*)(?P=quote)|(?P<other>\S))"""
+)
+# https://github.com/python/cpython/blob/3.13/Lib/configparser.py (ConfigParser._OPT_TMPL)
+setup_cfg_option_pattern: re.Pattern = re.compile(r"(?P<option>.*?)\s*[=:]\s*(?P<value>.*)$")
 jsonc_line_comment_pattern: re.Pattern = re.compile(r"//[^\n]*")
 jsonc_multiline_comment_pattern: re.Pattern = re.compile(r"/\*.*?\*/")
 
@@ -49,14 +78,74 @@ language_choices: list[Language] = [
     "js",
 ]
 
+# package-lock.json files at least this large are streamed with ijson if it's installed. Smaller
+# files are faster to load all at once.
+streamed_lockfile_min_size: int = 1024 * 1024
+js_lockfile_names: frozenset[str] = frozenset(("package-lock.json", "npm-shrinkwrap.json"))
+
 type NestedStrDict = dict[str, str | NestedStrDict]  # requires Python 3.12 or newer
 
 is_stdout_tty: bool = sys.stdout.isatty()
 searched_file_count: int = 0
+searched_file_count_lock: threading.Lock = threading.Lock()  # files are searched in many threads
+# resolved pip requirements file path -> (dep name -> dep file paths, number of files it references
+# directly or indirectly)
+pip_req_cache: dict[str, tuple[defaultdict[str, list[str]], int]] = {}
+pip_req_lock: threading.Lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Output:
+    """Prints messages, with ANSI colors unless the color fields are empty strings"""
+
+    verbose: bool
+    # https://chriswheeler.dev/posts/how-to-use-colors-in-terminals/
+    yellow: str = "\x1b[33m"
+    red: str = "\x1b[31m"
+    color_reset: str = "\x1b[0m"
+    # In verbose mode there's a message for every file, so messages are buffered and printed in
+    # batches. Call flush when done.
+    buffer_max_len: ClassVar[int] = 256
+    # The buffer and its lock are state, not settings, so they aren't compared or hashed.
+    buffer: list[str] = field(default_factory=list, compare=False, repr=False)
+    buffer_lock: threading.Lock = field(default_factory=threading.Lock, compare=False, repr=False)
+
+    def info(self, message: str) -> None:
+        """Prints a message only in verbose mode"""
+        if self.verbose:
+            self.write(f"{message}\n")
+
+    def warn(self, message: str) -> None:
+        """Prints a message in yellow"""
+        self.write(f"{self.yellow}{message}{self.color_reset}\n")
+
+    def error(self, message: str) -> None:
+        """Prints a message in red"""
+        self.write(f"{self.red}{message}{self.color_reset}\n")
+
+    def write(self, s: str) -> None:
+        """Prints a string now, or buffers it in verbose mode"""
+        if not self.verbose:
+            # This is one write call so that messages from different threads don't get mixed.
+            sys.stdout.write(s)
+            return
+
+        with self.buffer_lock:
+            self.buffer.append(s)
+            if len(self.buffer) >= self.buffer_max_len:
+                sys.stdout.write("".join(self.buffer))
+                self.buffer.clear()
+
+    def flush(self) -> None:
+        """Prints all buffered messages"""
+        with self.buffer_lock:
+            sys.stdout.write("".join(self.buffer))
+            self.buffer.clear()
 
 
 def main():
     global searched_file_count
+    pip_req_cache.clear()
 
     parser = argparse.ArgumentParser(
         prog="find-deps",
@@ -84,23 +173,34 @@ def main():
         default=["requirements.txt", "requirements-dev.txt"],
         help="name of a pip requirements file to search for; this option may be used multiple times",
     )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only parse files that contain the name of a dep you're searching for; the number of"
+        " unique dependencies found will then only count the dependencies in the parsed files",
+    )
 
     args = parser.parse_args()
+
+    # Warnings like those for invalid escape sequences in parsed setup.py files are about those
+    # files, not find-deps. The filter is set once here because warnings.catch_warnings isn't
+    # thread-safe, and files are searched in many threads.
+    warnings.filterwarnings("ignore", category=SyntaxWarning)
     language: Language = args.language
     deps_to_find: set[str] = set(args.deps)
     verbose: bool = args.verbose
     no_ansi: bool = args.no_ansi
-    excludes: list[str] = args.exclude
+    excludes: frozenset[str] = frozenset(args.exclude)
     exclude_inline: bool = args.exclude_inline
     pip_req_file_names: list[str] = [x.lower() for x in args.pip_req]
+    quick: bool = args.quick
 
+    # The message colors are chosen once here instead of being checked for every message.
+    out: Output
     if no_ansi or not is_stdout_tty:
-        global color_reset
-        color_reset = ""
-        global yellow
-        yellow = ""
-        global red
-        red = ""
+        out = Output(verbose, yellow="", red="", color_reset="")
+    else:
+        out = Output(verbose)
 
     dep_file_names: set[str] = set()
     match language:
@@ -129,177 +229,298 @@ def main():
         case _:
             raise ValueError("outdated match")
 
-    deps_map: defaultdict[str, list[Path]] = defaultdict(list)  # dep name -> dep file paths
-    all_found_dep_names: set[str] = set()
-    for dirpath, dirnames, filenames in Path.home().walk():
-        if dirpath.name in excludes:
-            dirnames.clear()
-            continue
-
-        for filename in filenames:
-            if filename not in dep_file_names and (
-                exclude_inline or not language == "py" or not filename.endswith(".py")
-            ):
-                continue
+    # All of these file names are lowercase, so the names of files that match them don't need to
+    # be lowercased before choosing how to parse the files.
+    dep_file_names_set: frozenset[str] = frozenset(dep_file_names)
+    pip_req_set: frozenset[str] = frozenset(pip_req_file_names)
+    search_inline: bool = language == "py" and not exclude_inline
 
-            file_path: Path = dirpath / filename
-
-            match filename.lower():
-                case "pyproject.toml":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    pyp_deps: set[str] = get_pyproject_deps(file_path, verbose)
-                    all_found_dep_names.update(pyp_deps)
-                    matches: set[str] = deps_to_find.intersection(pyp_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case "uv.lock":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    uv_lock_deps: set[str] = get_uv_lock_deps(file_path)
-                    all_found_dep_names.update(uv_lock_deps)
-                    matches: set[str] = deps_to_find.intersection(uv_lock_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case "setup.cfg":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    setup_cfg_deps: set[str] = get_py_setup_cfg_deps(file_path, verbose)
-                    all_found_dep_names.update(setup_cfg_deps)
-                    matches: set[str] = deps_to_find.intersection(setup_cfg_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case "setup.py":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    setup_py_deps: set[str] = get_setup_py_deps(file_path)
-                    all_found_dep_names.update(setup_py_deps)
-                    matches: set[str] = deps_to_find.intersection(setup_py_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case x if x.endswith(".py"):
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    inline_deps: set[str] = get_py_inline_deps(file_path, verbose)
-                    all_found_dep_names.update(inline_deps)
-                    matches: set[str] = deps_to_find.intersection(inline_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case x if x in pip_req_file_names:
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    req_deps: defaultdict[str, list[Path]] = get_pip_req_deps(
-                        file_path, verbose, excludes, pip_req_file_names
-                    )
-                    all_found_dep_names.update(req_deps)
-                    matches: set[str] = deps_to_find.intersection(req_deps.keys())
-                    for match in matches:
-                        deps_map[match].extend(req_deps[match])
-                case "package.json":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    pkg_deps: set[str] = get_js_package_json_deps(file_path)
-                    all_found_dep_names.update(pkg_deps)
-                    matches: set[str] = deps_to_find.intersection(pkg_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case "package-lock.json" | "npm-shrinkwrap.json":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    pl_deps: set[str] = get_js_package_lock_deps(file_path)
-                    all_found_dep_names.update(pl_deps)
-                    matches: set[str] = deps_to_find.intersection(pl_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case "deno.json" | "deno.jsonc":
-                    if verbose:
-                        print(f"Searching {file_path}")
-                    deno_deps: set[str] = get_deno_deps(file_path)
-                    all_found_dep_names.update(deno_deps)
-                    matches: set[str] = deps_to_find.intersection(deno_deps)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-                case _:
-                    if verbose:
-                        print(f"Naively searching {file_path}")
-                    matches: set[str] = file_naively_contains(file_path, deps_to_find)
-                    for match in matches:
-                        deps_map[match].append(file_path)
-
-            searched_file_count += 1
+    # The deps are encoded once here for the files that are searched as bytes.
+    deps_bytes: dict[str, bytes] = {dep: dep.encode() for dep in deps_to_find}
+    deps_map: defaultdict[str, list[str]] = defaultdict(list)  # dep name -> dep file paths
+    all_found_dep_names: set[str] = set()
+    files_to_search: Iterator[str] = find_dep_files(
+        str(Path.home()), excludes, dep_file_names_set, search_inline
+    )
+    try:
+        for found_dep_names, matches in search_dep_files_in_parallel(
+            files_to_search, deps_to_find, deps_bytes, out, excludes, pip_req_set, quick
+        ):
+            all_found_dep_names.update(found_dep_names)
+            for dep_name, paths in matches.items():
+                deps_map[dep_name].extend(paths)
+
+            with searched_file_count_lock:
+                searched_file_count += 1
             if is_stdout_tty and not verbose:
                 print(end="\r                                                  \r")
                 if exclude_inline or language != "py":
                     print(end=f"Searched {searched_file_count} dependency list files", flush=True)
                 else:
                     print(end=f"Searched {searched_file_count} files", flush=True)
+    finally:
+        out.flush()
 
+    # The results are printed with one write call because there can be many of them.
+    buf: list[str] = []
     if is_stdout_tty and not verbose:
-        print(end="\r                                                  \r")
+        buf.append("\r                                                  \r")
     if exclude_inline or language != "py":
-        print(f"Searched {searched_file_count} dependency list files")
+        buf.append(f"Searched {searched_file_count} dependency list files\n")
     else:
-        print(f"Searched {searched_file_count} files")
+        buf.append(f"Searched {searched_file_count} files\n")
 
-    print(f"Found {len(all_found_dep_names)} unique dependencies")
+    buf.append(f"Found {len(all_found_dep_names)} unique dependencies\n")
     if not deps_map:
-        print("None of the found dependencies match your query")
+        buf.append("None of the found dependencies match your query\n")
 
     for dep_name, dep_file_paths in deps_map.items():
-        print(f'"{dep_name}" found in {len(dep_file_paths)} files:')
-        for p in dep_file_paths:
-            print(f"    {p}")
+        buf.append(f'"{dep_name}" found in {len(dep_file_paths)} files:\n')
+        buf.extend(f"    {p}\n" for p in dep_file_paths)
+    sys.stdout.write("".join(buf))
+
+
+def find_dep_files(
+    root: str, excludes: frozenset[str], dep_file_names: frozenset[str], search_inline: bool
+) -> Iterator[str]:
+    """Walks a directory tree and yields the path of each file that should be searched"""
+    # The file names are checked in the order they were listed so that the results are printed in
+    # the same order each time.
+    for dirpath, filenames in walk_scandir(root, excludes):
+        for filename in filenames:
+            if filename in dep_file_names or (search_inline and filename.endswith(".py")):
+                yield os.path.join(dirpath, filename)
+
+
+def search_dep_files_in_parallel(
+    dep_file_paths: Iterator[str],
+    deps_to_find: set[str],
+    deps_bytes: dict[str, bytes],
+    out: Output,
+    excludes: frozenset[str],
+    pip_req_file_names: frozenset[str],
+    quick: bool,
+) -> Iterator[tuple[set[str], dict[str, list[str]]]]:
+    """Searches dependency files in a thread pool, yielding search_dep_file's results in order
+
+    The files are searched while the directory tree is still being walked, and only a limited
+    number of files are waiting to be searched or to have their results used at a time. In verbose
+    mode, files are searched one at a time so that the printed messages stay in order.
+    """
+    max_workers: int = 1 if out.verbose else (os.cpu_count() or 1) * 4
+    pending: deque[Future[tuple[set[str], dict[str, list[str]]]]] = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for dep_file_path in dep_file_paths:
+            pending.append(
+                executor.submit(
+                    search_dep_file,
+                    dep_file_path,
+                    deps_to_find,
+                    deps_bytes,
+                    out,
+                    excludes,
+                    pip_req_file_names,
+                    quick,
+                )
+            )
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def search_dep_file(
+    file_path: str,
+    deps_to_find: set[str],
+    deps_bytes: dict[str, bytes],
+    out: Output,
+    excludes: frozenset[str],
+    pip_req_file_names: frozenset[str],
+    quick: bool,
+) -> tuple[set[str], dict[str, list[str]]]:
+    """Searches one dependency file for the deps to find
+
+    Returns the names of all the dependencies found and a dict of each matching dependency name to
+    the paths of the files it's in. Those files can include pip requirements files referenced by
+    the chosen file. If quick is true, files that don't contain any of the deps' names aren't
+    parsed and nothing is returned for them.
+    """
+    file_name: str = os.path.basename(file_path)
+    # Pip requirements files are always parsed because the files they reference might have matches.
+    # Lockfiles that will be streamed are always parsed so that they aren't read all at once here.
+    if (
+        quick
+        and file_name not in pip_req_file_names
+        and not (file_name in js_lockfile_names and should_stream_js_package_lock(file_path))
+        and not file_mentions_any_dep(file_path, deps_bytes)
+    ):
+        out.info(f"Skipping {file_path} because it doesn't contain any of the deps' names")
+        return set(), {}
+
+    found_dep_names: set[str]
+    match file_name:
+        case "pyproject.toml":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_pyproject_deps(file_path, out)
+        case "uv.lock":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_uv_lock_deps(file_path, out)
+        case "setup.cfg":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_py_setup_cfg_deps(file_path, out)
+        case "setup.py":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_setup_py_deps(file_path, out)
+        case x if x.endswith(".py"):
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_py_inline_deps(file_path, out)
+        case x if x in pip_req_file_names:
+            out.info(f"Searching {file_path}")
+            # Pip requirements files are parsed one at a time so that files they share are only
+            # parsed once and results don't depend on which thread gets to them first.
+            with pip_req_lock:
+                req_deps: defaultdict[str, list[str]] = get_pip_req_deps(
+                    file_path, out, excludes, pip_req_file_names
+                )
+            return set(req_deps), {dep: req_deps[dep] for dep in deps_to_find if dep in req_deps}
+        case "package.json":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_js_package_json_deps(file_path, out)
+        case x if x in js_lockfile_names:
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_js_package_lock_deps(file_path, out)
+        case "deno.json" | "deno.jsonc":
+            out.info(f"Searching {file_path}")
+            found_dep_names = get_deno_deps(file_path, out)
+        case _:
+            out.info(f"Naively searching {file_path}")
+            naive_matches: set[str] = file_naively_contains(file_path, deps_bytes, out)
+            return set(), {match: [file_path] for match in naive_matches}
+
+    # There are usually far fewer deps to find than found deps, and usually none of them match, so
+    # this checks each dep to find instead of making an intersection set for every file.
+    return found_dep_names, {dep: [file_path] for dep in deps_to_find if dep in found_dep_names}
 
 
-def file_naively_contains(file_path: Path, deps: set[str]) -> set[str]:
+def walk_scandir(root: str, excludes: frozenset[str]) -> Iterator[tuple[str, list[str]]]:
+    """Walks a directory tree top-down, yielding each folder's path and the names of its files
+
+    Files and folders with excluded names are skipped, and so is everything in excluded folders.
+    Symlinks are not followed, and folders that cannot be read are skipped.
+    """
+    # os.scandir gets each entry's type from the directory listing itself, so unlike Path.walk
+    # this usually doesn't need to stat every entry.
+    stack: list[str] = [root]
+    while stack:
+        dirpath: str = stack.pop()
+        subdir_paths: list[str] = []
+        filenames: list[str] = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    # Excluded folders are pruned here, before they would be scanned.
+                    if entry.name in excludes:
+                        continue
+                    try:
+                        is_dir: bool = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        subdir_paths.append(entry.path)
+                    else:
+                        filenames.append(entry.name)
+        except OSError:
+            continue
+
+        yield dirpath, filenames
+        stack.extend(reversed(subdir_paths))
+
+
+def file_mentions_any_dep(file_path: str, deps_bytes: dict[str, bytes]) -> bool:
+    """Quickly checks whether any of the deps appear anywhere in the chosen file
+
+    This is much faster than parsing the file. If the file can't be read, True is returned so that
+    the error can be reported by the parser.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            contents: bytes = file.read()
+    except OSError:
+        return True
+
+    return any(dep_bytes in contents for dep_bytes in deps_bytes.values())
+
+
+def file_naively_contains(file_path: str, deps_bytes: dict[str, bytes], out: Output) -> set[str]:
     """Returns all naive matches present in the chosen file"""
     try:
-        contents: str = file_path.read_text(encoding="utf8", errors="ignore")
+        with open(file_path, "rb") as file:
+            contents: bytes = file.read()
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {file_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {file_path}")
         return set()
 
-    return set(dep for dep in deps if dep in contents)
+    return {dep for dep, dep_bytes in deps_bytes.items() if dep_bytes in contents}
+
+
+def read_file_text(file_path: str) -> str:
+    """Reads a UTF-8 file like Path.read_text with errors="ignore" but with less overhead
+
+    The whole file is usually read with one system call and decoded once. Newlines are normalized
+    the same way they are in text mode.
+    """
+    fd: int = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        # Asking for one more byte than the file's size lets the first read get the whole file.
+        chunk_size: int = os.fstat(fd).st_size + 1
+        chunks: list[bytes] = []
+        while chunk := os.read(fd, chunk_size):
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+    text: str = b"".join(chunks).decode("utf8", "ignore")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
 
 
-def get_pyproject_deps(pyproject_path: Path, verbose: bool) -> set[str]:
+def get_pyproject_deps(pyproject_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a pyproject.toml"""
     # https://packaging.python.org/en/latest/specifications/pyproject-toml
     deps: set[str] = set()
 
     try:
-        pyproject_s: str = pyproject_path.read_text(encoding="utf8", errors="ignore")
-    except Exception as err:
-        print(f"{red}{repr(err)} when reading {pyproject_path}{color_reset}")
-        return set()
-    if not pyproject_s:
+        # tomllib decodes the bytes itself, so the file isn't decoded before parsing too
+        with open(pyproject_path, "rb") as file:
+            pyproject: dict[str, Any] = tomllib.load(file)
+    except (tomllib.TOMLDecodeError, UnicodeDecodeError):
+        out.warn(f"Warning: skipping file with invalid TOML: {pyproject_path}")
         return set()
-
-    try:
-        pyproject: dict[str, Any] = tomllib.loads(pyproject_s)
-    except tomllib.TOMLDecodeError:
-        print(f"{yellow}Warning: skipping file with invalid TOML: {pyproject_path}{color_reset}")
+    except Exception as err:
+        out.error(f"{repr(err)} when reading {pyproject_path}")
         return set()
 
     if "project" in pyproject:
         project: dict[str, Any] = pyproject["project"]
         if "dependencies" in project:
             proj_deps: list[str | dict] = project["dependencies"]
-            deps.update(get_py_dep_names(proj_deps, verbose))
+            deps.update(get_py_dep_names(proj_deps, out))
         if "optional-dependencies" in project:
             opt_deps: dict[str, list[str | dict]] = project["optional-dependencies"]
             for dg in opt_deps.values():
-                deps.update(get_py_dep_names(dg, verbose))
+                deps.update(get_py_dep_names(dg, out))
     if "dependency-groups" in pyproject:
         dep_groups: dict[str, list[str | dict]] = pyproject["dependency-groups"]
         # https://packaging.python.org/en/latest/specifications/dependency-groups/
         for dg in dep_groups.values():
-            deps.update(get_py_dep_names(dg, verbose))
+            deps.update(get_py_dep_names(dg, out))
     if "build-system" in pyproject:
         build_sys: dict[str, Any] = pyproject["build-system"]
         if "requires" in build_sys:
             requires: list[str | dict] = build_sys["requires"]
-            deps.update(get_py_dep_names(requires, verbose))
+            deps.update(get_py_dep_names(requires, out))
     if "tool" in pyproject:
         tool: dict[str, Any] = pyproject["tool"]
         if "poetry" in tool:
@@ -318,64 +539,75 @@ def get_pyproject_deps(pyproject_path: Path, verbose: bool) -> set[str]:
     return deps
 
 
-def get_uv_lock_deps(uv_lock_path: Path) -> set[str]:
+def get_uv_lock_deps(uv_lock_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a uv.lock"""
     try:
-        contents: str = uv_lock_path.read_text(encoding="utf8", errors="ignore")
-    except Exception as err:
-        print(f"{red}{repr(err)} when reading {uv_lock_path}{color_reset}")
-        return set()
-    if not contents:
+        with open(uv_lock_path, "rb") as file:
+            uv_lock: dict[str, Any] = tomllib.load(file)
+    except (tomllib.TOMLDecodeError, UnicodeDecodeError):
+        out.warn(f"Warning: skipping file with invalid TOML: {uv_lock_path}")
         return set()
-
-    try:
-        uv_lock: dict[str, Any] = tomllib.loads(contents)
-    except tomllib.TOMLDecodeError:
-        print(f"{yellow}Warning: skipping file with invalid TOML: {uv_lock_path}{color_reset}")
+    except Exception as err:
+        out.error(f"{repr(err)} when reading {uv_lock_path}")
         return set()
 
     deps: set[str] = set()
 
-    pkgs: list[dict[str, Any]] = uv_lock["package"]
+    pkgs: list[dict[str, Any]] = uv_lock.get("package", [])
     deps.update(pkg["name"] for pkg in pkgs)
 
     return deps
 
 
-def get_py_setup_cfg_deps(setup_cfg_path: Path, verbose: bool) -> set[str]:
+def get_py_setup_cfg_deps(setup_cfg_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a Python setup.cfg"""
     # https://setuptools.pypa.io/en/latest/userguide/declarative_config.html
     try:
-        contents: str = setup_cfg_path.read_text(encoding="utf8", errors="ignore")
+        contents: str = read_file_text(setup_cfg_path)
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {setup_cfg_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {setup_cfg_path}")
         return set()
-    if not contents:
+    if not contents or "install_requires" not in contents.lower():
         return set()
 
-    config = configparser.ConfigParser()
-    try:
-        config.read_string(contents)
-    except Exception as err:
-        print(f"{red}{repr(err)} when loading {setup_cfg_path}{color_reset}")
-        return set()
-
-    if "options" not in config:
-        return set()
-    if "install_requires" not in config["options"]:
-        return set()
+    # Instead of parsing the whole file with configparser, this only looks for install_requires
+    # in the options section. Like with configparser's defaults, option names are case-insensitive,
+    # "=" or ":" can follow them, and their values continue onto lines that are indented more than
+    # the option and aren't comments.
+    in_options: bool = False
+    option_indent: int | None = None  # the indentation of the section's latest option, if any
+    reqs: list[str] | None = None
+    for line in contents.splitlines():
+        stripped: str = line.strip()
+        if not stripped or stripped[0] in "#;":
+            continue
+        indent: int = len(line) - len(line.lstrip())
+        if option_indent is not None and indent > option_indent:
+            if reqs is not None:
+                reqs.append(stripped)
+            continue  # the value continues
+        if reqs is not None:
+            break  # the end of install_requires
+
+        if stripped[0] == "[" and (header_end := stripped.rfind("]")) > 1:
+            in_options = stripped[1:header_end] == "options"
+            option_indent = None
+            continue
+        # Options are tracked in every section so that their values aren't mistaken for options.
+        option_match: re.Match | None = setup_cfg_option_pattern.match(stripped)
+        if not option_match:
+            continue
+        option_indent = indent
+        if in_options and option_match["option"].lower() == "install_requires":
+            reqs = [option_match["value"]] if option_match["value"] else []
 
-    reqs_s: str = config["options"]["install_requires"]
-    if not isinstance(reqs_s, str):
-        print(f"{red}Error: unexpected {type(reqs_s).__name__} in {setup_cfg_path}{color_reset}")
+    if not reqs:
         return set()
-
-    reqs: list[str] = reqs_s.splitlines()
-    deps: set[str] = get_py_dep_names(reqs, verbose)
+    deps: set[str] = get_py_dep_names(reqs, out)
     return deps
 
 
-def get_setup_py_deps(setup_py_path: Path) -> set[str]:
+def get_setup_py_deps(setup_py_path: str, out: Output) -> set[str]:
     """Attempts to get the names of all dependencies listed in a setup.py
 
     This function only succeeds if install_requires in setup.py is defined with a literal list with
@@ -383,124 +615,101 @@ def get_setup_py_deps(setup_py_path: Path) -> set[str]:
     missing some dependencies. A warning is printed in those cases.
     """
     try:
-        contents: str = setup_py_path.read_text(encoding="utf8", errors="ignore").strip()
+        contents: str = read_file_text(setup_py_path).strip()
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {setup_py_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {setup_py_path}")
         return set()
-    if not contents:
+    if not contents or "install_requires" not in contents:
         return set()
 
     try:
-        i: int = contents.index("install_requires")
-    except ValueError:
-        return set()
+        tree: ast.Module = ast.parse(contents, filename=setup_py_path)
+    except (SyntaxError, ValueError, MemoryError, RecursionError):
+        # Deeply nested code can overflow the parser's stack.
+        return scan_setup_py_deps(contents, setup_py_path, out)
 
-    i += len("install_requires")
-
-    while i < len(contents) and contents[i] != "=":
-        i += 1
-    i += 1
-    while i < len(contents) and contents[i] in (" ", "\t", "\n", "\r"):
-        i += 1
-    if i >= len(contents):
-        print(
-            f"{yellow}Warning: skipping file that appears to have invalid syntax:"
-            f" {setup_py_path}{color_reset}"
-        )
-        return set()
-    elif contents[i] != "[":
-        # it's not a literal list
-        print(
-            f"{yellow}Warning: unable to parse the dependency list in {setup_py_path}{color_reset}"
-        )
+    # install_requires can be a keyword argument of setup() or a variable that is passed to it
+    dep_lists: list[ast.List | ast.Tuple] = []
+    missed_deps: bool = False
+    for node in ast.walk(tree):
+        value: ast.expr
+        if isinstance(node, ast.keyword) and node.arg == "install_requires":
+            value = node.value
+            if isinstance(value, ast.Name) and value.id == "install_requires":
+                continue  # the variable's assignment is also visited
+        elif isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "install_requires"
+            for target in node.targets
+        ):
+            value = node.value
+        else:
+            continue
+
+        if isinstance(value, (ast.List, ast.Tuple)):
+            dep_lists.append(value)
+        else:
+            missed_deps = True
+
+    if not dep_lists:
+        if missed_deps:
+            # it's not a literal list
+            out.warn(f"Warning: unable to parse the dependency list in {setup_py_path}")
         return set()
-    # there's still a chance the contents of the list are not literal values
-    dep_list_start: int = i
-    i += 1
-
-    in_extras: bool = False
-    while i < len(contents):
-        if contents[i] == "[":
-            in_extras = True
-        elif contents[i] == "]":
-            if in_extras:
-                in_extras = False
+
+    deps: set[str] = set()
+    for dep_list in dep_lists:
+        for elt in dep_list.elts:
+            if not isinstance(elt, ast.Constant) or not isinstance(elt.value, str):
+                missed_deps = True
+                continue
+            dep_name: str | None = get_py_dep_name(elt.value)
+            if dep_name:
+                deps.add(dep_name)
             else:
-                break
-        i += 1
-    if i >= len(contents) or contents[i] != "]":
-        print(
-            f"{yellow}Warning: skipping file that appears to have invalid syntax:"
-            f" {setup_py_path}{color_reset}"
-        )
+                missed_deps = True
+
+    if missed_deps:
+        out.warn(f"Warning: could not fully parse the dependency list in {setup_py_path}")
+
+    return deps
+
+
+def scan_setup_py_deps(contents: str, setup_py_path: str, out: Output) -> set[str]:
+    """Attempts to get dependency names from a setup.py that can't be parsed, like a Python 2 one
+
+    Only a literal install_requires list of literal strings is found. A warning is printed if there
+    isn't one or if it has anything else in it.
+    """
+    list_match: re.Match | None = setup_py_dep_list_pattern.search(contents)
+    if not list_match:
+        out.warn(f"Warning: skipping file that appears to have invalid syntax: {setup_py_path}")
         return set()
-    dep_list_end: int = i
 
-    deps: list[str] = []
+    deps: set[str] = set()
     missed_deps: bool = False
-    i = dep_list_start + 1
-    while i < dep_list_end:
-        in_comment: bool = False
-        while i < dep_list_end and contents[i] not in ("'", '"'):
-            if in_comment:
-                if contents[i] == "\n":
-                    in_comment = False
-            else:
-                if contents[i] == "#":
-                    in_comment = True
-                elif contents[i] not in (" ", "\t", "\n", "\r", ","):
-                    missed_deps = True
-            i += 1
-        if i == dep_list_end:
-            break
-        str_start: int = i
-        i += 1
-        quote: str = contents[str_start]
-
-        escaped: bool = False
-        while i < dep_list_end:
-            if contents[i] == "\\":
-                escaped = not escaped
-            elif contents[i] == quote:
-                if escaped:
-                    escaped = False
-                else:
-                    break
-            else:
-                escaped = False
-            i += 1
-        if i >= dep_list_end:
-            print(
-                f"{yellow}Warning: skipping file that appears to have invalid syntax:"
-                f" {setup_py_path}{color_reset}"
-            )
-            return set()
-        str_end: int = i
-        i += 1
-
-        dep_spec: str = contents[str_start + 1 : str_end]
-        match: re.Match | None = py_dep_spec_pattern.match(dep_spec)
-        if match:
-            deps.append(match["name"])
-        else:
+    for item_match in setup_py_dep_list_item_pattern.finditer(list_match["items"]):
+        if item_match["other"]:
             missed_deps = True
+        elif item_match["quote"]:
+            dep_name: str | None = get_py_dep_name(item_match["spec"])
+            if dep_name:
+                deps.add(dep_name)
+            else:
+                missed_deps = True
 
     if missed_deps:
-        print(
-            f"{yellow}Warning: could not fully parse the dependency list in"
-            f" {setup_py_path}{color_reset}"
-        )
+        out.warn(f"Warning: could not fully parse the dependency list in {setup_py_path}")
 
-    return set(deps)
+    return deps
 
 
-def get_py_inline_deps(file_path: Path, verbose: bool) -> set[str]:
+def get_py_inline_deps(file_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a Python file's inline script metadata"""
     # https://packaging.python.org/en/latest/specifications/inline-script-metadata/
     try:
-        file_contents: str = file_path.read_text(encoding="utf8", errors="ignore")
+        file_contents: str = read_file_text(file_path)
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {file_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {file_path}")
         return set()
     if not file_contents:
         return set()
@@ -515,78 +724,131 @@ def get_py_inline_deps(file_path: Path, verbose: bool) -> set[str]:
         try:
             config: dict[str, Any] = tomllib.loads(config_s)
         except tomllib.TOMLDecodeError:
-            print(f"{yellow}Warning: skipping invalid TOML in {file_path}{color_reset}")
+            out.warn(f"Warning: skipping invalid TOML in {file_path}")
             continue
 
-        deps.update(get_py_dep_names(config["dependencies"], verbose))
+        deps.update(get_py_dep_names(config["dependencies"], out))
 
     return deps
 
 
 def get_pip_req_deps(
-    dep_file_path: Path, verbose: bool, excludes: list[str], pip_req_file_names: list[str]
-) -> defaultdict[str, list[Path]]:
-    """Gets the names of all dependencies listed in a pip requirements.txt & others it references"""
+    dep_file_path: str,
+    out: Output,
+    excludes: frozenset[str],
+    pip_req_file_names: frozenset[str],
+    ref_chain: set[str] | None = None,
+) -> defaultdict[str, list[str]]:
+    """Gets the names of all dependencies listed in a pip requirements.txt & others it references
+
+    The ref_chain set is for recursive calls; it holds the resolved paths of the files that led to
+    this one, so a reference back to any of them is skipped instead of recursing forever. Results
+    are cached in pip_req_cache unless a reference was skipped that way, so files that are
+    referenced by many others are only parsed once. The returned dict must not be changed. Only one
+    thread should call this at a time.
+    """
     global searched_file_count
     # https://pip.pypa.io/en/stable/reference/requirements-file-format/
-    deps_map: defaultdict[str, list[Path]] = defaultdict(list)  # dep name -> dep file paths
+    key: str = os.path.realpath(dep_file_path)
+    if key in pip_req_cache:
+        cached_deps_map, cached_ref_count = pip_req_cache[key]
+        # The referenced files are counted as searched each time, like when they're parsed.
+        with searched_file_count_lock:
+            searched_file_count += cached_ref_count
+        return cached_deps_map
+
+    deps_map: defaultdict[str, list[str]] = defaultdict(list)  # dep name -> dep file paths
+    if ref_chain is None:
+        ref_chain = set()
+    is_complete: bool = True
+    ref_count: int = 0
 
     try:
-        req_lines: list[str] = dep_file_path.read_text(
-            encoding="utf8", errors="ignore"
-        ).splitlines()
+        req_lines: list[str] = read_file_text(dep_file_path).splitlines()
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {dep_file_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {dep_file_path}")
         return defaultdict()
 
+    ref_chain.add(key)
+
+    # These are bound once to avoid attribute lookups for every line.
+    match_line = pip_req_line_pattern.match
+    strip = str.strip
+
     for line in req_lines:
-        dep_spec_match: re.Match | None = py_dep_spec_pattern.match(line.strip())
-        if dep_spec_match:
-            dep_name: str = dep_spec_match["name"]
+        line_match: re.Match | None = match_line(strip(line))
+        if not line_match:
+            continue
+        if line_match["name"]:
+            dep_name: str = line_match["name"]
             deps_map[dep_name].append(dep_file_path)
         else:
-            ref_match: re.Match | None = pip_file_ref_pattern.match(line.strip())
-            if not ref_match:
-                continue
-
-            reffed_req_name: str = ref_match[1]
+            reffed_req_name: str = line_match["ref"]
             if reffed_req_name in pip_req_file_names:
-                if verbose:
-                    print(
-                        f"{reffed_req_name} referenced but skipped this time because it's"
-                        " already in the list of file names to search"
-                    )
+                out.info(
+                    f"{reffed_req_name} referenced but skipped this time because it's"
+                    " already in the list of file names to search"
+                )
             elif reffed_req_name in excludes:
-                if verbose:
-                    print(
-                        f"{reffed_req_name} referenced but skipped because it's in the"
-                        " excludes list"
-                    )
+                out.info(
+                    f"{reffed_req_name} referenced but skipped because it's in the excludes list"
+                )
             elif len(Path(reffed_req_name).parts) > 1:
-                print(
-                    f"{red}Error: unexpected directory separator in pip requirements file"
-                    f" reference in {dep_file_path}{color_reset}"
+                out.error(
+                    "Error: unexpected directory separator in pip requirements file"
+                    f" reference in {dep_file_path}"
                 )
             else:
-                reffed_req_path: Path = dep_file_path.parent / reffed_req_name
-                if verbose:
-                    print(
-                        f"{reffed_req_name} referenced in {dep_file_path}\n"
-                        f"    Searching {reffed_req_path}"
+                reffed_req_path: str = os.path.join(
+                    os.path.dirname(dep_file_path), reffed_req_name
+                )
+                reffed_key: str = os.path.realpath(reffed_req_path)
+                if reffed_key in ref_chain:
+                    out.info(
+                        f"{reffed_req_name} referenced in {dep_file_path} but skipped because the"
+                        " references form a cycle"
                     )
-                reffed_deps: defaultdict[str, list[Path]] = get_pip_req_deps(
-                    reffed_req_path, verbose, excludes, pip_req_file_names
+                    is_complete = False
+                    continue
+
+                out.info(
+                    f"{reffed_req_name} referenced in {dep_file_path}\n"
+                    f"    Searching {reffed_req_path}"
                 )
+                reffed_deps: defaultdict[str, list[str]] = get_pip_req_deps(
+                    reffed_req_path, out, excludes, pip_req_file_names, ref_chain
+                )
+                if reffed_key in pip_req_cache:
+                    ref_count += 1 + pip_req_cache[reffed_key][1]
+                else:
+                    is_complete = False  # the referenced file's results are incomplete too
                 for dep_name, paths in reffed_deps.items():
                     deps_map[dep_name].extend(paths)
-                searched_file_count += 1
+                with searched_file_count_lock:
+                    searched_file_count += 1
 
+    ref_chain.remove(key)
+    if is_complete:
+        pip_req_cache[key] = (deps_map, ref_count)
     return deps_map
 
 
-def get_py_dep_names(dep_spec_list: list[str] | list[str | dict], verbose: bool) -> set[str]:
+@functools.lru_cache(maxsize=65536)
+def get_py_dep_name(dep_spec: str) -> str | None:
+    """Gets the dependency name from a Python dependency specifier, or None if it's invalid
+
+    The same specifiers often appear in many files, so the results are cached.
+    """
+    spec_match: re.Match | None = py_dep_spec_pattern.match(dep_spec)
+    if spec_match:
+        return spec_match["name"]
+    return None
+
+
+def get_py_dep_names(dep_spec_list: list[str] | list[str | dict], out: Output) -> set[str]:
     """Gets dependency names from a Python dependency specifiers list"""
     deps: set[str] = set()
+    strip = str.strip  # avoids an attribute lookup per dependency
 
     for dep_spec in dep_spec_list:
         if isinstance(dep_spec, dict):
@@ -594,23 +856,17 @@ def get_py_dep_names(dep_spec_list: list[str] | list[str | dict], verbose: bool)
             # https://packaging.python.org/en/latest/specifications/dependency-groups/#dependency-group-include
             continue
         if not isinstance(dep_spec, str):
-            if verbose:
-                print(
-                    f"{yellow}Warning: unexpected {type(dep_spec).__name__} in dependency"
-                    f" list{color_reset}"
-                )
+            if out.verbose:
+                out.warn(f"Warning: unexpected {type(dep_spec).__name__} in dependency list")
             continue
-        if not dep_spec.strip():
+        if not strip(dep_spec):
             continue
 
-        spec_match: re.Match | None = py_dep_spec_pattern.match(dep_spec)
-        if spec_match:
-            deps.add(spec_match["name"])
+        dep_name: str | None = get_py_dep_name(dep_spec)
+        if dep_name:
+            deps.add(dep_name)
         else:
-            print(
-                f'{red}Error: "{dep_spec}" did not match the dependency specification'
-                f" pattern{color_reset}"
-            )
+            out.error(f'Error: "{dep_spec}" did not match the dependency specification pattern')
 
         # if spec_match["extras"]:
         #     extras_s: str = str(spec_match["extras"]).strip("[]").strip()
@@ -626,12 +882,12 @@ def get_py_dep_names(dep_spec_list: list[str] | list[str | dict], verbose: bool)
     return deps
 
 
-def get_js_package_json_deps(file_path: Path) -> set[str]:
+def get_js_package_json_deps(file_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a package.json"""
     try:
-        text: str = file_path.read_text(encoding="utf8", errors="ignore").strip()
+        text: str = read_file_text(file_path).strip()
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {file_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {file_path}")
         return set()
     if not text:
         return set()
@@ -639,7 +895,7 @@ def get_js_package_json_deps(file_path: Path) -> set[str]:
     try:
         pkg: dict[str, Any] = json.loads(text)
     except json.JSONDecodeError:
-        print(f"{yellow}Warning: skipping file with invalid JSON: {file_path}{color_reset}")
+        out.warn(f"Warning: skipping file with invalid JSON: {file_path}")
         return set()
     else:
         if pkg:
@@ -649,15 +905,17 @@ def get_js_package_json_deps(file_path: Path) -> set[str]:
             return set()
 
 
-def get_js_package_lock_deps(package_lock_file_path: Path) -> set[str]:
+def get_js_package_lock_deps(package_lock_file_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a package-lock.json"""
     # https://docs.npmjs.com/cli/v10/configuring-npm/package-lock-json#dependencies
     deps: set[str] = set()
 
     try:
-        contents: str = package_lock_file_path.read_text(encoding="utf8", errors="ignore")
+        if should_stream_js_package_lock(package_lock_file_path):
+            return stream_js_package_lock_deps(package_lock_file_path, out)
+        contents: str = read_file_text(package_lock_file_path)
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {package_lock_file_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {package_lock_file_path}")
         return set()
     if not contents:
         return set()
@@ -665,10 +923,7 @@ def get_js_package_lock_deps(package_lock_file_path: Path) -> set[str]:
     try:
         pkg_lock: dict[str, Any] = json.loads(contents)
     except json.JSONDecodeError:
-        print(
-            f"{yellow}Warning: skipping file with invalid JSON:"
-            f" {package_lock_file_path}{color_reset}"
-        )
+        out.warn(f"Warning: skipping file with invalid JSON: {package_lock_file_path}")
         return set()
 
     if "packages" in pkg_lock:
@@ -679,6 +934,37 @@ def get_js_package_lock_deps(package_lock_file_path: Path) -> set[str]:
     return deps
 
 
+def should_stream_js_package_lock(package_lock_file_path: str) -> bool:
+    """Checks whether ijson is installed and a package-lock.json is large enough to be streamed"""
+    if ijson is None:
+        return False
+    try:
+        return os.stat(package_lock_file_path).st_size >= streamed_lockfile_min_size
+    except OSError:
+        return False  # the error is reported when the file is read
+
+
+def stream_js_package_lock_deps(package_lock_file_path: str, out: Output) -> set[str]:
+    """Gets the names of all dependencies listed in a package-lock.json without fully loading it
+
+    This requires ijson. Only one package from the file's packages object is in memory at a time.
+    """
+    deps: set[str] = set()
+
+    try:
+        with open(package_lock_file_path, "rb") as file:
+            for _, pkg in ijson.kvitems(file, "packages"):
+                deps.update(get_js_package_deps(pkg))
+    except ijson.JSONError:
+        out.warn(f"Warning: skipping file with invalid JSON: {package_lock_file_path}")
+        return set()
+    except Exception as err:
+        out.error(f"{repr(err)} when reading {package_lock_file_path}")
+        return set()
+
+    return deps
+
+
 def get_js_package_deps(pkg: dict[str, Any]) -> set[str]:
     """Gets the names of all dependencies in a JS package specification"""
     # https://docs.npmjs.com/cli/v11/configuring-npm/package-json#dependencies
@@ -709,17 +995,21 @@ def get_js_package_deps(pkg: dict[str, Any]) -> set[str]:
     return deps
 
 
-def get_js_nested_deps(pkg) -> set[str]:
+def get_js_nested_deps(pkg: dict[str, Any]) -> set[str]:
     """Gets the names of all packages in a JS package's dependencies object"""
-    if "dependencies" not in pkg:
-        return set()
-
     deps: set[str] = set()
 
-    pkg_deps: dict[str, Any] = pkg["dependencies"]
-    deps.update(pkg_deps.keys())
-    for pkg_dep in pkg_deps.values():
-        deps.update(get_js_nested_deps(pkg_dep))
+    # This uses a stack instead of recursion so that deeply nested lockfiles can't reach the
+    # recursion limit.
+    stack: list[dict[str, Any]] = [pkg]
+    while stack:
+        pkg = stack.pop()
+        if "dependencies" not in pkg:
+            continue
+        pkg_deps: dict[str, Any] = pkg["dependencies"]
+        deps.update(pkg_deps.keys())
+        # In package.json files, the dependencies' values are version strings, not packages.
+        stack.extend(pkg_dep for pkg_dep in pkg_deps.values() if isinstance(pkg_dep, dict))
 
     return deps
 
@@ -728,27 +1018,28 @@ def get_js_override_names(pkg_overrides: NestedStrDict) -> set[str]:
     """Gets the names of all packages in a JS package's overrides object"""
     overrides: set[str] = set()
 
-    overrides.update(pkg_overrides.keys())
-
-    for v in pkg_overrides.values():
-        if isinstance(v, dict):
-            overrides.update(get_js_override_names(v))
+    # This uses a stack instead of recursion for the same reason as get_js_nested_deps.
+    stack: list[NestedStrDict] = [pkg_overrides]
+    while stack:
+        pkg_overrides = stack.pop()
+        overrides.update(pkg_overrides.keys())
+        stack.extend(v for v in pkg_overrides.values() if isinstance(v, dict))
 
     return overrides
 
 
-def get_deno_deps(deno_json_path: Path) -> set[str]:
+def get_deno_deps(deno_json_path: str, out: Output) -> set[str]:
     """Gets the names of all dependencies listed in a deno.json or deno.jsonc"""
     # https://docs.deno.com/runtime/fundamentals/configuration/
     try:
-        deno_s: str = deno_json_path.read_text(encoding="utf8", errors="ignore")
+        deno_s: str = read_file_text(deno_json_path)
     except Exception as err:
-        print(f"{red}{repr(err)} when reading {deno_json_path}{color_reset}")
+        out.error(f"{repr(err)} when reading {deno_json_path}")
         return set()
     if not deno_s:
         return set()
 
-    if deno_json_path.suffix == ".jsonc":
+    if deno_json_path.endswith(".jsonc"):
         # remove all comments
         deno_s = jsonc_line_comment_pattern.sub("", deno_s)
         deno_s = jsonc_multiline_comment_pattern.sub("", deno_s)
@@ -756,7 +1047,7 @@ def get_deno_deps(deno_json_path: Path) -> set[str]:
     try:
         deno: dict[str, Any] = json.loads(deno_s)
     except json.JSONDecodeError:
-        print(f"{yellow}Warning: skipping file with invalid JSON: {deno_json_path}{color_reset}")
+        out.warn(f"Warning: skipping file with invalid JSON: {deno_json_path}")
         return set()
 
     deps: set[str] = set()